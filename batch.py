@@ -0,0 +1,524 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# DCASE 2020 Challenge Task 1: Batch validation of submission packages
+# ---------------------------------------------
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+#
+# Packages are queued into a SQLite database. Any number of worker processes claim packages with a lease,
+# validate them and store results back into the same database. Leases of crashed workers expire and
+# packages are claimed again.
+#
+# By default the queue uses WAL mode, which needs shared memory and works only on a local disk, so the
+# queue is bound to the node which created it. A queue created with --shared uses the rollback journal
+# instead and can be used from several nodes on a shared filesystem with working POSIX file locking.
+
+import os
+import sys
+import io
+import glob
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import contextlib
+import multiprocessing
+from limits import *
+
+STATE_PENDING = 'pending'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+LEASE_TIMEOUT_DEFAULT = 600
+MAX_ATTEMPTS_DEFAULT = 3
+POLL_INTERVAL = 1.0
+
+PACKAGE_EXTENSIONS = ['.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT UNIQUE NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued REAL,
+    started REAL,
+    finished REAL,
+    error_count INTEGER,
+    error TEXT,
+    log TEXT
+);
+CREATE INDEX IF NOT EXISTS packages_state ON packages (state, lease_expires);
+"""
+
+
+def connect(db, shared=False):
+    """Open queue database
+
+    A new queue is created in WAL mode and bound to the current node with a '.node' file next to the
+    database, unless shared is set. Mode of an existing queue is kept.
+
+    Parameters
+    ----------
+    db : str
+        Database file
+
+    shared : bool
+        Create the queue for several nodes on a shared filesystem, using the rollback journal.
+        Default value False
+
+    Returns
+    -------
+    sqlite3.Connection
+
+    """
+
+    node_filename = db + '.node'
+    if os.path.exists(node_filename):
+        with open(node_filename, 'r') as file:
+            node = file.read().strip()
+
+        if node != socket.gethostname():
+            raise IOError('Queue [{db:}] is in WAL mode and bound to node [{node:}], create the queue with --shared for multi-node use'.format(
+                db=db,
+                node=node)
+            )
+
+        journal_mode = 'WAL'
+
+    elif os.path.exists(db) or shared:
+        journal_mode = 'DELETE'
+
+    else:
+        with open(node_filename, 'w') as file:
+            file.write(socket.gethostname())
+
+        journal_mode = 'WAL'
+
+    conn = sqlite3.connect(db, timeout=60, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode={mode:}'.format(mode=journal_mode))
+    conn.execute('PRAGMA busy_timeout=60000')
+    conn.executescript(SCHEMA)
+
+    return conn
+
+
+def worker_id():
+    return '{host:}:{pid:}'.format(host=socket.gethostname(), pid=os.getpid())
+
+
+def enqueue(conn, paths):
+    """Add packages to the queue, already queued packages are skipped
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+
+    paths : list of str
+        Package files or unpacked package directories
+
+    Returns
+    -------
+    int
+        Count of added packages
+
+    """
+
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    before = conn.total_changes
+    conn.executemany(
+        'INSERT OR IGNORE INTO packages (path, state, enqueued) VALUES (?, ?, ?)',
+        [(os.path.abspath(path), STATE_PENDING, now) for path in paths]
+    )
+    added = conn.total_changes - before
+    conn.execute('COMMIT')
+
+    return added
+
+
+def claim(conn, worker, lease_timeout=LEASE_TIMEOUT_DEFAULT, max_attempts=MAX_ATTEMPTS_DEFAULT):
+    """Claim next package
+
+    Packages with an expired lease are claimed again, until max_attempts is reached.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+
+    worker : str
+        Worker identifier
+
+    lease_timeout : float
+        Lease length in seconds.
+        Default value LEASE_TIMEOUT_DEFAULT
+
+    max_attempts : int
+        Maximum attempts per package.
+        Default value MAX_ATTEMPTS_DEFAULT
+
+    Returns
+    -------
+    sqlite3.Row or None
+
+    """
+
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Give up packages which keep crashing workers
+        conn.execute(
+            'UPDATE packages SET state = ?, finished = ?, error = ? '
+            'WHERE state = ? AND lease_expires < ? AND attempts >= ?',
+            (STATE_FAILED, now, 'Lease expired {attempts:} times'.format(attempts=max_attempts),
+             STATE_RUNNING, now, max_attempts)
+        )
+
+        row = conn.execute(
+            'SELECT * FROM packages WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT 1',
+            (STATE_PENDING, STATE_RUNNING, now)
+        ).fetchone()
+
+        if row is not None:
+            conn.execute(
+                'UPDATE packages SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, started = ? '
+                'WHERE id = ?',
+                (STATE_RUNNING, worker, now + lease_timeout, now, row['id'])
+            )
+            row = conn.execute('SELECT * FROM packages WHERE id = ?', (row['id'],)).fetchone()
+
+        conn.execute('COMMIT')
+
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    return row
+
+
+def renew(conn, package_id, worker, lease_timeout=LEASE_TIMEOUT_DEFAULT):
+    """Extend lease of a claimed package
+
+    Returns
+    -------
+    bool
+        False if the lease was lost to another worker
+
+    """
+
+    cursor = conn.execute(
+        'UPDATE packages SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?',
+        (time.time() + lease_timeout, package_id, worker, STATE_RUNNING)
+    )
+
+    return cursor.rowcount == 1
+
+
+def complete(conn, package_id, worker, state, error_count=None, error=None, log=None):
+    """Store result of a claimed package
+
+    Returns
+    -------
+    bool
+        False if the lease was lost to another worker, result is not stored then
+
+    """
+
+    cursor = conn.execute(
+        'UPDATE packages SET state = ?, finished = ?, error_count = ?, error = ?, log = ?, lease_expires = NULL '
+        'WHERE id = ? AND worker = ? AND state = ?',
+        (state, time.time(), error_count, error, log, package_id, worker, STATE_RUNNING)
+    )
+
+    return cursor.rowcount == 1
+
+
+def validate(path, limits=None, cancel_event=None):
+    """Validate one package with main.validate_package, capturing the printed report
+
+    Parameters
+    ----------
+    path : str
+        Package file or unpacked package directory
+
+    limits : dict
+        Resource limits.
+        Default value None
+
+    cancel_event : threading.Event
+        Validation is aborted when set.
+        Default value None
+
+    Returns
+    -------
+    tuple
+        (state, error_count, error, log)
+
+    """
+
+    from main import PARAM, validate_package
+
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            error_count = validate_package(
+                package=path,
+                param=PARAM,
+                budget=ResourceBudget(limits=limits, cancel_event=cancel_event)
+            )
+
+        return STATE_DONE, error_count, None, log.getvalue()
+
+    except Exception as exc:
+        return STATE_FAILED, None, '{type:}: {message:}'.format(type=type(exc).__name__, message=exc), log.getvalue()
+
+
+def work(db, lease_timeout=LEASE_TIMEOUT_DEFAULT, max_attempts=MAX_ATTEMPTS_DEFAULT, limits=None, wait=True):
+    """Worker loop, claims and validates packages until the queue is finished
+
+    Parameters
+    ----------
+    db : str
+        Database file
+
+    lease_timeout : float
+        Lease length in seconds, lease is renewed while validating.
+        Default value LEASE_TIMEOUT_DEFAULT
+
+    max_attempts : int
+        Maximum attempts per package.
+        Default value MAX_ATTEMPTS_DEFAULT
+
+    limits : dict
+        Resource limits.
+        Default value None
+
+    wait : bool
+        Keep polling while other workers have packages running, to take over expired leases.
+        Default value True
+
+    Returns
+    -------
+    int
+        Count of packages processed by this worker
+
+    """
+
+    worker = worker_id()
+    conn = connect(db)
+    processed = 0
+
+    while True:
+        row = claim(conn, worker=worker, lease_timeout=lease_timeout, max_attempts=max_attempts)
+        if row is None:
+            running = conn.execute('SELECT COUNT(*) FROM packages WHERE state = ?', (STATE_RUNNING,)).fetchone()[0]
+            if wait and running:
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            break
+
+        # Renew lease in the background while validating, validation is cancelled if the lease is lost
+        stop = threading.Event()
+        lease_lost = threading.Event()
+
+        def heartbeat():
+            heartbeat_conn = connect(db)
+            while not stop.wait(lease_timeout / 3.0):
+                if not renew(heartbeat_conn, package_id=row['id'], worker=worker, lease_timeout=lease_timeout):
+                    lease_lost.set()
+                    break
+
+            heartbeat_conn.close()
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+
+        try:
+            state, error_count, error, log = validate(path=row['path'], limits=limits, cancel_event=lease_lost)
+
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+
+        if lease_lost.is_set() or not complete(conn, package_id=row['id'], worker=worker, state=state, error_count=error_count, error=error, log=log):
+            print('Lease lost, result discarded [{worker:}] [{path:}]'.format(worker=worker, path=row['path']))
+            continue
+
+        processed += 1
+
+    conn.close()
+
+    return processed
+
+
+def status(conn):
+    """Queue status
+
+    Returns
+    -------
+    dict
+        Package counts per state, elapsed time, throughput (packages per second) and estimated remaining time
+
+    """
+
+    counts = {STATE_PENDING: 0, STATE_RUNNING: 0, STATE_DONE: 0, STATE_FAILED: 0}
+    for row in conn.execute('SELECT state, COUNT(*) AS count FROM packages GROUP BY state'):
+        counts[row['state']] = row['count']
+
+    row = conn.execute(
+        'SELECT MIN(started) AS first_started, MAX(finished) AS last_finished FROM packages WHERE state IN (?, ?)',
+        (STATE_DONE, STATE_FAILED)
+    ).fetchone()
+
+    finished = counts[STATE_DONE] + counts[STATE_FAILED]
+    total = sum(counts.values())
+    elapsed = None
+    throughput = None
+    remaining = None
+    if finished and row['first_started'] is not None:
+        elapsed = max(row['last_finished'] - row['first_started'], 1e-6)
+        throughput = finished / elapsed
+        remaining = (total - finished) / throughput
+
+    return {
+        'counts': counts,
+        'total': total,
+        'finished': finished,
+        'elapsed': elapsed,
+        'throughput': throughput,
+        'remaining': remaining
+    }
+
+
+def print_status(conn):
+    info = status(conn)
+    line = '{finished:}/{total:} finished [pending {pending:}, running {running:}, done {done:}, failed {failed:}]'.format(
+        finished=info['finished'],
+        total=info['total'],
+        **info['counts']
+    )
+
+    if info['throughput'] is not None:
+        line += ' {throughput:.2f} packages/s, ETA {remaining:.0f} s'.format(
+            throughput=info['throughput'],
+            remaining=info['remaining']
+        )
+
+    print(line)
+
+    return info
+
+
+def results(conn):
+    """Stored results
+
+    Returns
+    -------
+    list of dict
+
+    """
+
+    return [
+        dict(row) for row in conn.execute(
+            'SELECT path, state, worker, attempts, started, finished, error_count, error, log FROM packages ORDER BY id'
+        )
+    ]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Batch validation of submission packages through a shared work queue')
+    parser.add_argument('-d', '--db', help='Queue database (SQLite), on a local disk unless created with --shared', type=str, required=True)
+    parser.add_argument('--shared', help='Create the queue for several nodes on a shared filesystem (rollback journal instead of WAL)', action='store_true')
+    subparsers = parser.add_subparsers(dest='command')
+
+    parser_enqueue = subparsers.add_parser('enqueue', help='Add packages to the queue')
+    parser_enqueue.add_argument('paths', help='Package files or directories containing packages', nargs='+')
+    parser_enqueue.add_argument('--unpacked', help='Enqueue subdirectories of given directories as unpacked packages', action='store_true')
+
+    parser_worker = subparsers.add_parser('worker', help='Run workers on this node')
+    parser_worker.add_argument('-n', '--workers', help='Worker process count', type=int, default=1)
+    parser_worker.add_argument('--lease-timeout', help='Lease length in seconds', type=float, default=LEASE_TIMEOUT_DEFAULT)
+    parser_worker.add_argument('--max-attempts', help='Maximum attempts per package', type=int, default=MAX_ATTEMPTS_DEFAULT)
+    parser_worker.add_argument('--no-wait', help='Exit when nothing is left to claim, even if other workers are running', action='store_true')
+    add_limit_arguments(parser_worker)
+
+    parser_status = subparsers.add_parser('status', help='Show progress')
+    parser_status.add_argument('--follow', help='Update status until the queue is finished', action='store_true')
+
+    parser_results = subparsers.add_parser('results', help='Print results as JSON lines')
+    parser_results.add_argument('--log', help='Include validation report', action='store_true')
+
+    args = parser.parse_args(argv[1:])
+
+    if args.command == 'enqueue':
+        paths = []
+        for path in args.paths:
+            if os.path.isdir(path) and args.unpacked:
+                with os.scandir(path) as entries:
+                    paths += sorted(entry.path for entry in entries if entry.is_dir())
+
+            elif os.path.isdir(path):
+                for extension in PACKAGE_EXTENSIONS:
+                    paths += sorted(glob.glob(os.path.join(path, '*' + extension)))
+
+            else:
+                paths.append(path)
+
+        conn = connect(args.db, shared=args.shared)
+        print('Added {count:} packages'.format(count=enqueue(conn, paths)))
+        print_status(conn)
+
+    elif args.command == 'worker':
+        worker_kwargs = {
+            'db': args.db,
+            'lease_timeout': args.lease_timeout,
+            'max_attempts': args.max_attempts,
+            'limits': limits_from_arguments(args),
+            'wait': not args.no_wait
+        }
+
+        if args.workers == 1:
+            work(**worker_kwargs)
+
+        else:
+            processes = [multiprocessing.Process(target=work, kwargs=worker_kwargs) for i in range(0, args.workers)]
+            for process in processes:
+                process.start()
+
+            for process in processes:
+                process.join()
+
+        print_status(connect(args.db, shared=args.shared))
+
+    elif args.command == 'status':
+        conn = connect(args.db, shared=args.shared)
+        while True:
+            info = print_status(conn)
+            if not args.follow or info['finished'] == info['total']:
+                break
+
+            time.sleep(POLL_INTERVAL)
+
+    elif args.command == 'results':
+        for item in results(connect(args.db, shared=args.shared)):
+            if not args.log:
+                del item['log']
+
+            print(json.dumps(item))
+
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+
+import os
+import json
+import hashlib
+
+# Sketch size (bins) and LSH banding for near-duplicate lookup, SKETCH_SIZE has to be divisible by BAND_SIZE
+SKETCH_SIZE = 64
+BAND_SIZE = 4
+
+# Decimals kept from probabilities before sketching
+PROBABILITY_DECIMALS = 2
+
+# Estimated similarity above which outputs are flagged as near-duplicates
+SIMILARITY_THRESHOLD = 0.8
+
+INDEX_VERSION = 3
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _quantize(value):
+    try:
+        return '{value:.{decimals:}f}'.format(value=float(value), decimals=PROBABILITY_DECIMALS)
+
+    except ValueError:
+        return value
+
+
+def output_content_hash(data):
+    """Exact-match key for system output, computed from raw content before parsing
+
+    Parameters
+    ----------
+    data : str
+        File content
+
+    Returns
+    -------
+    str
+
+    """
+
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def output_fingerprint(content_hash, csv_fields, rows, param):
+    """Fingerprint for system output
+
+    Parameters
+    ----------
+    content_hash : str
+        Exact-match key from output_content_hash
+
+    csv_fields : list of str
+        Header fields
+
+    rows : list of list
+        Data rows
+
+    param : dict
+        Output parameters, 'fields_float' is used
+
+    Returns
+    -------
+    dict
+        'content_hash' is given exact-match key, 'label_hash' covers sorted (filename, scene_label) pairs,
+        and 'sketch' is one-permutation MinHash over rows with quantized probabilities.
+
+    """
+
+    filename_index = csv_fields.index('filename') if 'filename' in csv_fields else None
+    scene_label_index = csv_fields.index('scene_label') if 'scene_label' in csv_fields else None
+    float_indices = [csv_fields.index(field) for field in param['fields_float'] if field in csv_fields]
+
+    label_pairs = []
+    sketch = [None] * SKETCH_SIZE
+    for row in rows:
+        filename = os.path.split(row[filename_index])[-1] if filename_index is not None and filename_index < len(row) else ''
+        scene_label = row[scene_label_index] if scene_label_index is not None and scene_label_index < len(row) else ''
+        label_pairs.append(filename + '\t' + scene_label)
+
+        token = '\t'.join([filename] + [_quantize(row[index]) for index in float_indices if index < len(row)])
+        value = _hash64(token)
+        bin_id = value % SKETCH_SIZE
+        bin_value = value // SKETCH_SIZE
+        if sketch[bin_id] is None or bin_value < sketch[bin_id]:
+            sketch[bin_id] = bin_value
+
+    label_hash = hashlib.sha256('\n'.join(sorted(label_pairs)).encode('utf-8'))
+
+    return {
+        'content_hash': content_hash,
+        'label_hash': label_hash.hexdigest(),
+        'sketch': sketch
+    }
+
+
+def sketch_similarity(sketch1, sketch2):
+    """Estimate Jaccard similarity between two sketches
+
+    Parameters
+    ----------
+    sketch1 : list
+    sketch2 : list
+
+    Returns
+    -------
+    float
+
+    """
+
+    bins = [(a, b) for a, b in zip(sketch1, sketch2) if a is not None or b is not None]
+    if not bins:
+        return 0.0
+
+    return sum(1 for a, b in bins if a == b) / float(len(bins))
+
+
+class FingerprintIndex(object):
+    """Persistent index of system output fingerprints"""
+
+    def __init__(self, filename=None):
+        """Constructor
+
+        Parameters
+        ----------
+        filename : str
+            Index file in JSON format, loaded if it exists.
+            Default value None
+
+        """
+
+        self.filename = filename
+        self.entries = {}
+        self.labels = {}
+        self.bands = {}
+
+        if self.filename is not None and os.path.isfile(self.filename):
+            self.load()
+
+    def load(self):
+        with open(self.filename, 'r') as file:
+            data = json.load(file)
+
+        if data.get('version') != INDEX_VERSION:
+            raise IOError('Unsupported fingerprint index version [{filename:}]'.format(filename=self.filename))
+
+        self.entries = data['entries']
+        self.labels = {}
+        self.bands = {}
+        for content_hash, entry in self.entries.items():
+            self._add_keys(content_hash=content_hash, entry=entry)
+
+        return self
+
+    def save(self):
+        if self.filename is None:
+            return self
+
+        # Write to a temporary file first, so an interrupted save does not corrupt the index
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w') as file:
+            json.dump({'version': INDEX_VERSION, 'entries': self.entries}, file)
+
+        os.replace(tmp_filename, self.filename)
+
+        return self
+
+    def lookup(self, content_hash):
+        """Find exact duplicate
+
+        Parameters
+        ----------
+        content_hash : str
+            Exact-match key from output_content_hash
+
+        Returns
+        -------
+        dict or None
+            Stored entry
+
+        """
+
+        return self.entries.get(content_hash)
+
+    def entry_fingerprint(self, content_hash):
+        """Fingerprint of a stored entry, used for near-duplicate lookup without parsing the output again
+
+        Parameters
+        ----------
+        content_hash : str
+            Exact-match key from output_content_hash
+
+        Returns
+        -------
+        dict
+
+        """
+
+        entry = self.entries[content_hash]
+        return {
+            'content_hash': content_hash,
+            'label_hash': entry['label_hash'],
+            'sketch': entry['sketch']
+        }
+
+    def near_duplicates(self, fingerprint, threshold=SIMILARITY_THRESHOLD, submission_label=None):
+        """Find near-duplicates
+
+        Candidates are collected through label hash and sketch band buckets, so only outputs sharing
+        at least one bucket are compared.
+
+        Parameters
+        ----------
+        fingerprint : dict
+            Fingerprint from output_fingerprint
+
+        threshold : float
+            Similarity threshold.
+            Default value SIMILARITY_THRESHOLD
+
+        submission_label : str
+            Entries validated only under this label (earlier versions of the same submission) are left out.
+            Default value None
+
+        Returns
+        -------
+        list of tuple
+            (entry, similarity, same_labels), most similar first
+
+        """
+
+        candidates = set(self.labels.get(fingerprint['label_hash'], []))
+        for band_key in self._band_keys(fingerprint['sketch']):
+            candidates.update(self.bands.get(band_key, []))
+
+        candidates.discard(fingerprint['content_hash'])
+
+        result = []
+        for content_hash in candidates:
+            entry = self.entries[content_hash]
+            if submission_label is not None and set(entry['submissions']) <= {submission_label}:
+                continue
+
+            same_labels = entry['label_hash'] == fingerprint['label_hash']
+            similarity = sketch_similarity(fingerprint['sketch'], entry['sketch'])
+            if same_labels or similarity >= threshold:
+                result.append((entry, similarity, same_labels))
+
+        return sorted(result, key=lambda item: (item[2], item[1]), reverse=True)
+
+    def add(self, fingerprint, submission_label, error_count, errors=None):
+        """Add validation result
+
+        Parameters
+        ----------
+        fingerprint : dict
+            Fingerprint from output_fingerprint
+
+        submission_label : str
+            Label (or filename) of the submission
+
+        error_count : int
+            Errors found in the system output
+
+        errors : list
+            Reported error messages, printed again when the result is reused.
+            Default value None
+
+        Returns
+        -------
+        dict
+            Stored entry
+
+        """
+
+        content_hash = fingerprint['content_hash']
+        if content_hash in self.entries:
+            entry = self.entries[content_hash]
+            if submission_label not in entry['submissions']:
+                entry['submissions'].append(submission_label)
+
+        else:
+            entry = {
+                'label_hash': fingerprint['label_hash'],
+                'sketch': fingerprint['sketch'],
+                'error_count': error_count,
+                'errors': errors if errors is not None else [],
+                'submissions': [submission_label]
+            }
+            self.entries[content_hash] = entry
+            self._add_keys(content_hash=content_hash, entry=entry)
+
+        return entry
+
+    def _add_keys(self, content_hash, entry):
+        self.labels.setdefault(entry['label_hash'], []).append(content_hash)
+        for band_key in self._band_keys(entry['sketch']):
+            self.bands.setdefault(band_key, []).append(content_hash)
+
+    @staticmethod
+    def _band_keys(sketch):
+        keys = []
+        for band_id in range(0, SKETCH_SIZE // BAND_SIZE):
+            band = sketch[band_id * BAND_SIZE:(band_id + 1) * BAND_SIZE]
+            if None not in band:
+                keys.append('{band_id:}:{values:}'.format(band_id=band_id, values=','.join(str(value) for value in band)))
+
+        return keys
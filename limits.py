@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+
+import os
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Default resource limits, these are generous compared to a real submission package
+# (system output files are only a few megabytes), but stop decompression bombs early.
+LIMITS_DEFAULT = {
+    'total_bytes_max': 1024 * 1024 * 1024,      # Total uncompressed bytes inflated per package
+    'member_bytes_max': 128 * 1024 * 1024,      # Uncompressed bytes per package member
+    'compression_ratio_max': 100,               # Uncompressed / compressed size per member
+    'member_count_max': 1000,                   # Members in the package
+    'row_count_max': 100000,                    # Rows per system output file
+    'time_max': None,                           # Wall-clock seconds per package, None = no limit
+    'rss_max': None,                            # Resident set size in bytes, None = no limit
+}
+
+CHUNK_SIZE = 64 * 1024
+
+# Compression ratio is not checked for members smaller than this, tiny files compress unpredictably
+RATIO_CHECK_MIN_BYTES = 1024 * 1024
+
+
+# Command line arguments for limits, (argument, limit field, type, help)
+LIMIT_ARGUMENTS = [
+    ('--max-total-bytes', 'total_bytes_max', int, 'Limit for total uncompressed bytes per package'),
+    ('--max-member-bytes', 'member_bytes_max', int, 'Limit for uncompressed bytes per package member'),
+    ('--max-ratio', 'compression_ratio_max', float, 'Limit for compression ratio per package member'),
+    ('--max-members', 'member_count_max', int, 'Limit for member count in package'),
+    ('--max-rows', 'row_count_max', int, 'Limit for row count in system output file'),
+    ('--max-time', 'time_max', float, 'Wall-clock budget per package in seconds'),
+    ('--max-rss', 'rss_max', int, 'Memory (resident set size) budget in bytes'),
+]
+
+
+class ResourceLimitError(IOError):
+    """Raised when a resource limit is exceeded while validating"""
+    pass
+
+
+class ValidationCancelledError(IOError):
+    """Raised when validation is cancelled from outside, e.g. batch worker lost its lease"""
+    pass
+
+
+def current_rss():
+    """Current resident set size of the process
+
+    Read from /proc when available, otherwise peak resident set size is used.
+
+    Returns
+    -------
+    int or None
+        Bytes
+
+    """
+
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    if resource is not None:
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if os.uname().sysname == 'Darwin':
+            return rss
+
+        return rss * 1024
+
+    return None
+
+
+def add_limit_arguments(parser):
+    """Add limit arguments to argument parser
+
+    Parameters
+    ----------
+    parser : argparse.ArgumentParser
+
+    """
+
+    for argument, limit_field, argument_type, argument_help in LIMIT_ARGUMENTS:
+        parser.add_argument(argument, dest=limit_field, help=argument_help, type=argument_type)
+
+
+def limits_from_arguments(args):
+    """Collect limits given in command line arguments
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+
+    Returns
+    -------
+    dict
+
+    """
+
+    limits = {}
+    for argument, limit_field, argument_type, argument_help in LIMIT_ARGUMENTS:
+        if getattr(args, limit_field, None) is not None:
+            limits[limit_field] = getattr(args, limit_field)
+
+    return limits
+
+
+class ResourceBudget(object):
+    """Resource usage bookkeeping for one package"""
+
+    def __init__(self, limits=None, cancel_event=None):
+        """Constructor
+
+        Parameters
+        ----------
+        limits : dict
+            Limits, missing items are taken from LIMITS_DEFAULT.
+            Default value None
+
+        cancel_event : threading.Event
+            When set, validation is aborted at the next budget check.
+            Default value None
+
+        """
+
+        self.limits = dict(LIMITS_DEFAULT)
+        if limits:
+            self.limits.update(limits)
+
+        self.cancel_event = cancel_event
+        self.start_time = time.time()
+        self.total_bytes = 0
+        self.member_count = 0
+
+        # Members already streamed fully, re-reading them is not counted into total_bytes again
+        self.counted_members = set()
+
+    def check(self):
+        """Check cancellation, wall-clock time and memory budget"""
+
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ValidationCancelledError('Validation cancelled')
+
+        if self.limits['time_max'] is not None:
+            elapsed = time.time() - self.start_time
+            if elapsed > self.limits['time_max']:
+                raise ResourceLimitError('Time budget exceeded [{elapsed:.1f} s > {limit:} s]'.format(
+                    elapsed=elapsed,
+                    limit=self.limits['time_max'])
+                )
+
+        if self.limits['rss_max'] is not None:
+            rss = current_rss()
+            if rss is not None and rss > self.limits['rss_max']:
+                raise ResourceLimitError('Memory budget exceeded [{rss:} > {limit:} bytes]'.format(
+                    rss=rss,
+                    limit=self.limits['rss_max'])
+                )
+
+    def add_member(self, name):
+        """Account one package member
+
+        Parameters
+        ----------
+        name : str
+            Member name
+
+        """
+
+        self.member_count += 1
+        if self.limits['member_count_max'] is not None and self.member_count > self.limits['member_count_max']:
+            raise ResourceLimitError('Too many members in package [{count:} > {limit:}] at [{name:}]'.format(
+                count=self.member_count,
+                limit=self.limits['member_count_max'],
+                name=name)
+            )
+
+    def check_rows(self, row_count):
+        """Check row count of a system output file
+
+        Parameters
+        ----------
+        row_count : int
+            Rows read so far
+
+        """
+
+        if self.limits['row_count_max'] is not None and row_count > self.limits['row_count_max']:
+            raise ResourceLimitError('Too many rows in system output [{count:} > {limit:}]'.format(
+                count=row_count,
+                limit=self.limits['row_count_max'])
+            )
+
+    def check_declared_size(self, name, file_size, compress_size=None):
+        """Check member sizes declared in the package before reading it
+
+        Parameters
+        ----------
+        name : str
+            Member name
+
+        file_size : int
+            Declared uncompressed size in bytes
+
+        compress_size : int
+            Declared compressed size in bytes.
+            Default value None
+
+        """
+
+        self._check_member_bytes(name=name, size=file_size)
+        if compress_size is not None:
+            self.check_ratio(name=name, size=file_size, compress_size=compress_size)
+
+    def iter_chunks(self, file, name, compress_size=None):
+        """Read stream in chunks while enforcing limits
+
+        Each member is counted into total uncompressed bytes only once, even if it is read several times.
+
+        Parameters
+        ----------
+        file : file-like
+            Stream opened in binary mode
+
+        name : str
+            Member name, used in error messages
+
+        compress_size : int
+            Compressed size of the member, when given compression ratio is checked.
+            Default value None
+
+        Yields
+        ------
+        bytes
+
+        """
+
+        size = 0
+        counted = name in self.counted_members
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if not counted:
+                self.total_bytes += len(chunk)
+
+            self._check_member_bytes(name=name, size=size)
+            if compress_size is not None:
+                self.check_ratio(name=name, size=size, compress_size=compress_size)
+
+            self._check_total_bytes(name=name)
+            self.check()
+            yield chunk
+
+        self.counted_members.add(name)
+
+    def add_bytes(self, name, size):
+        """Account bytes inflated outside iter_chunks, e.g. skipped members of a streamed archive
+
+        Parameters
+        ----------
+        name : str
+            Member name, used in error messages
+
+        size : int
+            Bytes
+
+        """
+
+        self.total_bytes += size
+        self._check_total_bytes(name=name)
+
+    def read(self, file, name, compress_size=None):
+        """Read stream fully while enforcing limits
+
+        Parameters
+        ----------
+        file : file-like
+            Stream opened in binary mode
+
+        name : str
+            Member name, used in error messages
+
+        compress_size : int
+            Compressed size of the member, when given compression ratio is checked.
+            Default value None
+
+        Returns
+        -------
+        bytes
+
+        """
+
+        return b''.join(self.iter_chunks(file=file, name=name, compress_size=compress_size))
+
+    def _check_total_bytes(self, name):
+        if self.limits['total_bytes_max'] is not None and self.total_bytes > self.limits['total_bytes_max']:
+            raise ResourceLimitError('Total uncompressed size limit exceeded [> {limit:} bytes] at [{name:}]'.format(
+                limit=self.limits['total_bytes_max'],
+                name=name)
+            )
+
+    def _check_member_bytes(self, name, size):
+        if self.limits['member_bytes_max'] is not None and size > self.limits['member_bytes_max']:
+            raise ResourceLimitError('Member size limit exceeded [> {limit:} bytes] at [{name:}]'.format(
+                limit=self.limits['member_bytes_max'],
+                name=name)
+            )
+
+    def check_ratio(self, name, size, compress_size):
+        """Check compression ratio
+
+        Parameters
+        ----------
+        name : str
+            Member name, used in error messages
+
+        size : int
+            Uncompressed size in bytes
+
+        compress_size : int
+            Compressed size in bytes
+
+        """
+
+        if size < RATIO_CHECK_MIN_BYTES or self.limits['compression_ratio_max'] is None:
+            return
+
+        if size > self.limits['compression_ratio_max'] * max(compress_size, 1):
+            raise ResourceLimitError('Compression ratio limit exceeded [> {limit:}] at [{name:}]'.format(
+                limit=self.limits['compression_ratio_max'],
+                name=name)
+            )
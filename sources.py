@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+
+import os
+import io
+import zlib
+import tarfile
+import zipfile
+import tempfile
+from validators import print_error
+
+# Members buffered in memory when reading streamed tar archives, larger are spooled to disk
+SPOOL_SIZE = 16 * 1024 * 1024
+
+
+def is_task_file(name):
+    """Check if package member is a system output or meta information file
+
+    Parameters
+    ----------
+    name : str
+        Member name
+
+    Returns
+    -------
+    bool
+
+    """
+
+    return 'task1' in name and '.pdf' not in name
+
+
+class PackageSource(object):
+    """Base class for submission package sources
+
+    Members are given as dicts with fields 'name' (relative path with '/' separators), 'size' and
+    'compress_size' (None when not compressed).
+
+    """
+
+    error_type = 'package'
+    package_type = 'package'
+
+    def __init__(self, path, budget):
+        """Constructor
+
+        Parameters
+        ----------
+        path : str
+            Package path
+
+        budget : ResourceBudget
+            Resource limits for the package
+
+        """
+
+        self.path = path
+        self.budget = budget
+        self._members = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+    def members(self):
+        """Package members, directories are excluded
+
+        Returns
+        -------
+        list of dict
+
+        """
+
+        if self._members is None:
+            self._members = []
+            for member in self._discover():
+                self.budget.add_member(member['name'])
+                self.budget.check_declared_size(
+                    name=member['name'],
+                    file_size=member['size'],
+                    compress_size=member['compress_size']
+                )
+                self._members.append(member)
+
+        return self._members
+
+    def member(self, name):
+        for member in self.members():
+            if member['name'] == name:
+                return member
+
+        raise KeyError(name)
+
+    def bad_files(self):
+        """Check package integrity
+
+        Returns
+        -------
+        list of str
+            Names of broken members
+
+        """
+
+        return []
+
+    def open(self, name):
+        """Open member as buffered binary stream
+
+        Parameters
+        ----------
+        name : str
+            Member name
+
+        Returns
+        -------
+        file-like
+
+        """
+
+        raise NotImplementedError
+
+    def read(self, name):
+        """Read member while enforcing resource limits
+
+        Parameters
+        ----------
+        name : str
+            Member name
+
+        Returns
+        -------
+        bytes
+
+        """
+
+        with self.open(name) as file:
+            return self.budget.read(file=file, name=name, compress_size=self.member(name)['compress_size'])
+
+    def _discover(self):
+        raise NotImplementedError
+
+
+class ZipSource(PackageSource):
+    """Package in ZIP format"""
+
+    error_type = 'ZIP'
+    package_type = 'ZIP'
+
+    def __init__(self, path, budget):
+        super(ZipSource, self).__init__(path=path, budget=budget)
+        self.zip = zipfile.ZipFile(path, 'r')
+
+    def close(self):
+        self.zip.close()
+
+    def bad_files(self):
+        # Members are inflated in chunks to enforce resource limits, CRC is checked at the end of each member
+        bad_files = []
+        for member in self.members():
+            try:
+                with self.open(member['name']) as file:
+                    for chunk in self.budget.iter_chunks(file=file, name=member['name'], compress_size=member['compress_size']):
+                        pass
+
+            except zipfile.BadZipFile:
+                bad_files.append(member['name'])
+
+        return bad_files
+
+    def open(self, name):
+        return self.zip.open(name, 'r')
+
+    def _discover(self):
+        for file_info in self.zip.infolist():
+            if not file_info.is_dir():
+                yield {
+                    'name': file_info.filename,
+                    'size': file_info.file_size,
+                    'compress_size': file_info.compress_size
+                }
+
+
+class DirectorySource(PackageSource):
+    """Unpacked package directory, validated in place"""
+
+    error_type = 'DIR'
+    package_type = 'directory'
+
+    def open(self, name):
+        return open(os.path.join(self.path, *name.split('/')), 'rb')
+
+    def _discover(self):
+        directories = [(self.path, '')]
+        while directories:
+            path, prefix = directories.pop(0)
+            with os.scandir(path) as entries:
+                for entry in sorted(entries, key=lambda item: item.name):
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append((entry.path, prefix + entry.name + '/'))
+
+                    elif entry.is_file(follow_symlinks=False):
+                        yield {
+                            'name': prefix + entry.name,
+                            'size': entry.stat(follow_symlinks=False).st_size,
+                            'compress_size': None
+                        }
+
+
+class FileSource(DirectorySource):
+    """Individual files given directly, member names are the file paths"""
+
+    error_type = 'file'
+    package_type = 'file'
+
+    def __init__(self, filenames, budget):
+        super(FileSource, self).__init__(path='', budget=budget)
+        self.filenames = filenames
+
+    def open(self, name):
+        return open(name, 'rb')
+
+    def _discover(self):
+        for filename in self.filenames:
+            yield {
+                'name': filename,
+                'size': os.path.getsize(filename),
+                'compress_size': None
+            }
+
+
+class TarSource(PackageSource):
+    """Package in tar format (optionally gzip, bzip2 or xz compressed)
+
+    The archive is read as a stream in a single pass, system output and meta information files are
+    buffered while reading and other members are skipped.
+
+    """
+
+    error_type = 'TAR'
+    package_type = 'TAR'
+
+    def __init__(self, path, budget):
+        super(TarSource, self).__init__(path=path, budget=budget)
+        self.buffers = {}
+        self._bad_files = []
+
+    def close(self):
+        for buffer in self.buffers.values():
+            buffer.close()
+
+        self.buffers = {}
+
+    def bad_files(self):
+        # Stream was read while discovering members, reading stopped at the first broken member
+        self.members()
+        return self._bad_files
+
+    def open(self, name):
+        # Copy, so the caller closing the stream does not close the buffer
+        return io.BufferedReader(io.BytesIO(self.read(name)))
+
+    def read(self, name):
+        # Limits were enforced while buffering
+        buffer = self.buffers[name]
+        buffer.seek(0)
+        return buffer.read()
+
+    def _discover(self):
+        with open(self.path, 'rb') as raw:
+            name = None
+            try:
+                with tarfile.open(fileobj=raw, mode='r|*') as tar:
+                    inflated_size = 0
+                    skipped = None
+                    for tar_info in tar:
+                        # Data of the skipped member has been read past when the next header is reached
+                        if skipped is not None:
+                            self._add_skipped(raw=raw, member=skipped, inflated_size=inflated_size)
+                            skipped = None
+
+                        name = tar_info.name[2:] if tar_info.name.startswith('./') else tar_info.name
+                        if not tar_info.isfile():
+                            continue
+
+                        member = {
+                            'name': name,
+                            'size': tar_info.size,
+                            'compress_size': None
+                        }
+                        yield member
+
+                        inflated_size += tar_info.size
+                        if is_task_file(name):
+                            buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+                            for chunk in self.budget.iter_chunks(file=tar.extractfile(tar_info), name=name):
+                                buffer.write(chunk)
+
+                            self.buffers[name] = buffer
+                            self._check_stream_ratio(raw=raw, name=name, inflated_size=inflated_size)
+
+                        else:
+                            skipped = member
+
+                    if skipped is not None:
+                        self._add_skipped(raw=raw, member=skipped, inflated_size=inflated_size)
+
+            except (tarfile.TarError, EOFError, zlib.error):
+                self._bad_files.append(name if name is not None else os.path.split(self.path)[-1])
+
+    def _add_skipped(self, raw, member, inflated_size):
+        self.budget.add_bytes(name=member['name'], size=member['size'])
+        self._check_stream_ratio(raw=raw, name=member['name'], inflated_size=inflated_size)
+
+    def _check_stream_ratio(self, raw, name, inflated_size):
+        # Compression ratio over the whole stream, members are not compressed individually
+        self.budget.check_ratio(name=name, size=inflated_size, compress_size=raw.tell())
+        self.budget.check()
+
+
+def open_source(path, budget):
+    """Open package source based on path type
+
+    Parameters
+    ----------
+    path : str
+        Package file (ZIP or tar) or unpacked package directory
+
+    budget : ResourceBudget
+        Resource limits for the package
+
+    Returns
+    -------
+    PackageSource
+
+    """
+
+    if not os.path.exists(path):
+        raise IOError('Package file not found [{filename:}]'.format(filename=path))
+
+    if os.path.isdir(path):
+        return DirectorySource(path=path, budget=budget)
+
+    elif zipfile.is_zipfile(path):
+        return ZipSource(path=path, budget=budget)
+
+    elif tarfile.is_tarfile(path):
+        return TarSource(path=path, budget=budget)
+
+    else:
+        raise IOError('Unknown package format [{filename:}], use ZIP, tar or directory'.format(filename=path))
+
+
+def collect_task_files(source):
+    """Group system output and meta information files by subtask and submission label
+
+    Parameters
+    ----------
+    source : PackageSource
+
+    Returns
+    -------
+    dict
+        Files as task_files[subtask][submission_label]['output' or 'meta'] = member name
+
+    """
+
+    task_files = {}
+    for member in source.members():
+        name = member['name']
+        if is_task_file(name):
+            # Submission label is the third directory level, as in <name>_task1/task1/<submission_label>/
+            path_parts = os.path.split(name)[0].split('/')
+            if len(path_parts) < 3:
+                print_error(source.error_type, 'File outside submission directory [{filename:s}]'.format(filename=name))
+                continue
+
+            submission_label = path_parts[2]
+            submission_label_parts = submission_label.split('_')
+            if len(submission_label_parts) < 3:
+                print_error(source.error_type, 'Possibly wrongly formatted filename [{filename:s}]'.format(filename=name))
+                continue
+
+            subtask = submission_label_parts[2]
+
+            if subtask not in task_files:
+                if subtask not in ['task1a', 'task1b']:
+                    print_error(source.error_type, 'Unknown task indicator [{tag:}] in [{name:}]'.format(tag=subtask, name=name))
+                    continue
+
+                else:
+                    task_files[subtask] = {}
+
+            if submission_label not in task_files[subtask]:
+                task_files[subtask][submission_label] = {}
+
+            if '.output.csv' in name:
+                task_files[subtask][submission_label]['output'] = name
+            elif '.meta.yaml' in name:
+                task_files[subtask][submission_label]['meta'] = name
+            else:
+                print_error(source.error_type, 'Possibly wrongly formatted filename [{filename:s}]'.format(filename=name))
+
+    return task_files
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+#
+# Batch queue tests, local processes stand in for worker nodes.
+
+import os
+import sys
+import time
+import zipfile
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import batch
+
+LEASE_TIMEOUT = 1.0
+
+FIELDS = ['filename', 'scene_label', 'airport', 'bus', 'metro', 'metro_station', 'park', 'public_square',
+          'shopping_mall', 'street_pedestrian', 'street_traffic', 'tram']
+
+META = """submission:
+  label: Test_TAU_task1a_1
+  name: Test
+  abbreviation: Test
+  authors:
+    - {lastname: Doe, firstname: John, email: john.doe@example.com, affiliation: {institute: TAU}, corresponding: true}
+system:
+  description: {input_sampling_rate: 44.1kHz}
+  complexity: {total_parameters: 1000}
+  external_datasets: []
+  source_code: ''
+results:
+  development_dataset:
+    overall: {accuracy: 50.0, logloss: 1.0}
+"""
+
+
+def write_package(filename):
+    # Only ten rows, so validation reports incorrect number of entries
+    output = '\t'.join(FIELDS) + '\n' + ''.join(
+        'audio/{index:}.wav\tbus'.format(index=index) + '\t0.1' * (len(FIELDS) - 2) + '\n' for index in range(0, 10)
+    )
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('Test_task1/task1/Test_TAU_task1a_1/Test_TAU_task1a_1.output.csv', output)
+        z.writestr('Test_task1/task1/Test_TAU_task1a_1/Test_TAU_task1a_1.meta.yaml', META)
+
+    return filename
+
+
+def claim_and_hang(db, claimed):
+    # Worker which crashes in the middle of validation
+    conn = batch.connect(db)
+    batch.claim(conn, worker=batch.worker_id(), lease_timeout=LEASE_TIMEOUT)
+    claimed.set()
+    time.sleep(60)
+
+
+def crash_worker(db):
+    claimed = multiprocessing.Event()
+    process = multiprocessing.Process(target=claim_and_hang, args=(db, claimed))
+    process.start()
+    assert claimed.wait(10)
+    process.kill()
+    process.join()
+
+    return '{host:}:{pid:}'.format(host=batch.socket.gethostname(), pid=process.pid)
+
+
+def run_workers(db, count, **kwargs):
+    kwargs['db'] = db
+    processes = [multiprocessing.Process(target=batch.work, kwargs=kwargs) for i in range(0, count)]
+    for process in processes:
+        process.start()
+
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+
+def test_lease_takeover(tmp_path):
+    db = str(tmp_path / 'queue.db')
+    batch.enqueue(batch.connect(db), [write_package(str(tmp_path / 'package.zip'))])
+
+    crashed_worker = crash_worker(db)
+    run_workers(db, count=2, lease_timeout=LEASE_TIMEOUT)
+
+    results = batch.results(batch.connect(db))
+    assert len(results) == 1
+    assert results[0]['state'] == batch.STATE_DONE
+    assert results[0]['attempts'] == 2
+    assert results[0]['worker'] != crashed_worker
+    assert results[0]['error_count'] > 0
+
+
+def test_max_attempts(tmp_path):
+    db = str(tmp_path / 'queue.db')
+    batch.enqueue(batch.connect(db), [write_package(str(tmp_path / 'package.zip'))])
+
+    crash_worker(db)
+    processed = batch.work(db, lease_timeout=LEASE_TIMEOUT, max_attempts=1)
+
+    results = batch.results(batch.connect(db))
+    assert processed == 0
+    assert results[0]['state'] == batch.STATE_FAILED
+    assert results[0]['attempts'] == 1
+    assert 'Lease expired' in results[0]['error']
+
+
+def test_multiple_workers(tmp_path):
+    db = str(tmp_path / 'queue.db')
+    packages = [write_package(str(tmp_path / 'package_{index:}.zip'.format(index=index))) for index in range(0, 6)]
+    batch.enqueue(batch.connect(db), packages)
+
+    run_workers(db, count=3, lease_timeout=LEASE_TIMEOUT)
+
+    conn = batch.connect(db)
+    info = batch.status(conn)
+    assert info['counts'][batch.STATE_DONE] == 6
+    assert all(item['attempts'] == 1 for item in batch.results(conn))
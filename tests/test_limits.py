@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+#
+# Resource limit tests, tiny decompression bombs are built on the fly.
+
+import os
+import io
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main
+from limits import ResourceBudget, ResourceLimitError
+from validators import validate_output
+from test_batch import FIELDS, write_package
+
+MEGABYTE = 1024 * 1024
+
+
+def write_zip(filename, name, data):
+    package = write_package(filename)
+    with zipfile.ZipFile(package, 'a', zipfile.ZIP_DEFLATED) as z:
+        z.writestr(name, data)
+
+    return package
+
+
+def write_tar(filename, name, data):
+    # Extra member first, followed by task files from the ZIP package
+    with zipfile.ZipFile(write_package(filename + '.zip'), 'r') as z:
+        members = [(item, z.read(item)) for item in z.namelist()]
+
+    with tarfile.open(filename, 'w:gz') as tar:
+        for member_name, member_data in [(name, data)] + members:
+            tar_info = tarfile.TarInfo(member_name)
+            tar_info.size = len(member_data)
+            tar.addfile(tar_info, io.BytesIO(member_data))
+
+    return filename
+
+
+def validate(package, limits=None):
+    budget = ResourceBudget(limits=limits)
+    return main.validate_package(package=package, param=main.PARAM, budget=budget), budget
+
+
+@pytest.mark.parametrize('extension', ['zip', 'tar.gz'])
+def test_normal_package(tmp_path, extension):
+    package = str(tmp_path / ('package.' + extension))
+    report = os.urandom(2 * MEGABYTE)
+    if extension == 'zip':
+        write_zip(package, 'Test_task1/Test_technical_report.pdf', report)
+
+    else:
+        write_tar(package, 'Test_task1/Test_technical_report.pdf', report)
+
+    error_count, budget = validate(package)
+
+    # Same validation result as without the report, and each member is counted once into total bytes
+    assert error_count == validate(write_package(str(tmp_path / 'reference.zip')))[0]
+    with main.open_source(path=package, budget=ResourceBudget()) as source:
+        assert budget.total_bytes == sum(member['size'] for member in source.members())
+
+
+def test_zip_compression_ratio(tmp_path):
+    package = write_zip(str(tmp_path / 'package.zip'), 'Test_task1/Test_technical_report.pdf', bytes(2 * MEGABYTE))
+    with pytest.raises(ResourceLimitError, match='Compression ratio'):
+        validate(package)
+
+
+def test_zip_member_bytes(tmp_path):
+    package = write_zip(str(tmp_path / 'package.zip'), 'Test_task1/Test_technical_report.pdf', os.urandom(2 * MEGABYTE))
+    with pytest.raises(ResourceLimitError, match='Member size'):
+        validate(package, limits={'member_bytes_max': MEGABYTE})
+
+
+def test_zip_total_bytes(tmp_path):
+    package = write_zip(str(tmp_path / 'package.zip'), 'Test_task1/Test_technical_report.pdf', os.urandom(2 * MEGABYTE))
+    with pytest.raises(ResourceLimitError, match='Total uncompressed size'):
+        validate(package, limits={'total_bytes_max': MEGABYTE})
+
+
+def test_tar_compression_ratio(tmp_path):
+    package = write_tar(str(tmp_path / 'package.tar.gz'), 'Test_task1/Test_technical_report.pdf', bytes(4 * MEGABYTE))
+    with pytest.raises(ResourceLimitError, match='Compression ratio'):
+        validate(package)
+
+
+def test_tar_member_bytes(tmp_path):
+    package = write_tar(str(tmp_path / 'package.tar.gz'), 'Test_task1/Test_technical_report.pdf', bytes(4 * MEGABYTE))
+    with pytest.raises(ResourceLimitError, match='Member size'):
+        validate(package, limits={'member_bytes_max': MEGABYTE, 'compression_ratio_max': None})
+
+
+def test_output_rows(tmp_path):
+    data = '\t'.join(FIELDS) + '\n' + ''.join(
+        'audio/{index:}.wav\tbus'.format(index=index) + '\t0.1' * (len(FIELDS) - 2) + '\n' for index in range(0, 10)
+    )
+    with pytest.raises(ResourceLimitError, match='Too many rows'):
+        validate_output(data, main.PARAM['A']['output'], budget=ResourceBudget(limits={'row_count_max': 5}))
+
+    assert validate_output(data, main.PARAM['A']['output'], budget=ResourceBudget(limits={'row_count_max': 10})) == 1
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+#
+# Package source tests.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from limits import ResourceBudget
+from sources import DirectorySource, collect_task_files
+
+
+def write_files(path, names):
+    for name in names:
+        filename = os.path.join(str(path), *name.split('/'))
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w') as file:
+            file.write('')
+
+
+def test_collect_task_files(tmp_path, capsys):
+    write_files(tmp_path, [
+        'Test_task1/task1/Test_TAU_task1a_1/Test_TAU_task1a_1.output.csv',
+        'Test_task1/task1/Test_TAU_task1a_1/Test_TAU_task1a_1.meta.yaml',
+        'Test_task1/task1/Test_TAU_task1a_2/extra/Test_TAU_task1a_2.output.csv',
+        'Test_task1/task1/Test_TAU_task1a_2/Test_TAU_task1a_2.meta.yaml',
+        'Test_task1/task1/Test_TAU_task1a_3.output.csv',
+        'Test_task1/Test_technical_report.pdf',
+    ])
+
+    with DirectorySource(path=str(tmp_path), budget=ResourceBudget()) as source:
+        task_files = collect_task_files(source)
+
+    # Files in subdirectories are grouped under the submission directory
+    assert task_files == {
+        'task1a': {
+            'Test_TAU_task1a_1': {
+                'output': 'Test_task1/task1/Test_TAU_task1a_1/Test_TAU_task1a_1.output.csv',
+                'meta': 'Test_task1/task1/Test_TAU_task1a_1/Test_TAU_task1a_1.meta.yaml'
+            },
+            'Test_TAU_task1a_2': {
+                'output': 'Test_task1/task1/Test_TAU_task1a_2/extra/Test_TAU_task1a_2.output.csv',
+                'meta': 'Test_task1/task1/Test_TAU_task1a_2/Test_TAU_task1a_2.meta.yaml'
+            }
+        }
+    }
+    assert 'File outside submission directory [Test_task1/task1/Test_TAU_task1a_3.output.csv]' in capsys.readouterr().out
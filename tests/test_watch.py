@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+#
+# Incremental re-validation tests, results are compared against full validation of the same content.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main
+import watch
+from validators import validate_output
+from test_batch import FIELDS
+
+PARAM = main.PARAM['A']['output']
+
+HEADER = '\t'.join(FIELDS)
+
+
+def row(index, scene_label='bus', value='0.1'):
+    return 'audio/{index:}.wav\t{scene_label:}'.format(index=index, scene_label=scene_label) + ('\t' + value) * (len(FIELDS) - 2)
+
+
+def content(rows, header=HEADER):
+    return '\n'.join([header] + rows) + '\n'
+
+
+def assert_same_as_full(state, data, capsys):
+    error_count = validate_output(data, PARAM)
+    capsys.readouterr()
+
+    filenames = set(os.path.split(line.split('\t')[0])[-1] for line in data.splitlines()[1:])
+    assert state.error_count == error_count
+    assert state.unique_file_count == len(filenames)
+
+
+@pytest.fixture
+def rows():
+    # Blocks are compared first, so more rows than in one block
+    return [row(index) for index in range(0, watch.BLOCK_SIZE * 2 + 10)]
+
+
+def test_insert(rows, capsys):
+    state = watch.OutputState(param=PARAM)
+    state.update(content(rows))
+
+    rows.insert(100, row(5))
+    data = content(rows)
+    removed_rows, changed_rows = state.update(data)
+    assert removed_rows == []
+    assert changed_rows == [100]
+    assert state.duplicate_count == 1
+    assert_same_as_full(state, data, capsys)
+
+
+@pytest.mark.parametrize('row_index', [0, 300, -1])
+def test_delete(rows, row_index, capsys):
+    # Duplicate at the given position is removed
+    rows.insert(len(rows) if row_index == -1 else row_index, row(5))
+
+    state = watch.OutputState(param=PARAM)
+    state.update(content(rows))
+    assert state.duplicate_count == 1
+
+    del rows[row_index]
+    data = content(rows)
+    removed_rows, changed_rows = state.update(data)
+    assert len(removed_rows) == 1
+    assert changed_rows == []
+    assert state.duplicate_count == 0
+    assert_same_as_full(state, data, capsys)
+
+
+def test_edit(rows, capsys):
+    state = watch.OutputState(param=PARAM)
+    state.update(content(rows))
+
+    rows[300] = row(300, scene_label='unknown', value='x')
+    data = content(rows)
+    removed_rows, changed_rows = state.update(data)
+    assert removed_rows == [300]
+    assert changed_rows == [300]
+    assert state.row_errors[300]
+    assert_same_as_full(state, data, capsys)
+
+    rows[300] = row(300)
+    data = content(rows)
+    state.update(data)
+    assert state.row_errors[300] == []
+    assert_same_as_full(state, data, capsys)
+
+
+def test_header(rows, capsys):
+    state = watch.OutputState(param=PARAM)
+    state.update(content(rows))
+
+    data = content(rows, header=HEADER.replace('scene_label', 'label'))
+    removed_rows, changed_rows = state.update(data)
+    assert len(removed_rows) == len(rows)
+    assert len(changed_rows) == len(rows)
+    assert state.header_error_count == 1
+    assert_same_as_full(state, data, capsys)
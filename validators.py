@@ -4,6 +4,7 @@
 # License: MIT
 
 from utils import *
+from fingerprint import output_content_hash, output_fingerprint
 import csv
 import os
 from io import StringIO
@@ -21,6 +22,41 @@ def print_error(error_type, message):
         print('  [{type:6s}]    {message:}'.format(type=error_type.upper(), message=message))
 
 
+def validate_filenames(output_filename, meta_filename, subtask_label):
+    error_count = 0
+
+    for filename, description, label_description, suffix in [
+            (output_filename, 'System output', 'system OUTPUT', 'output.csv'),
+            (meta_filename, 'System meta information', 'system META information', 'meta.yaml')]:
+        filename_parts = filename.split('.')
+        submission_label = filename_parts[0].split('_')
+
+        # Check filename formatting
+        if len(filename_parts) != 3:
+            print_error('filename', [
+                '{description:} has filename in wrong format [{filename:}]'.format(description=description, filename=filename),
+                'Correct format is [SUBMISSION LABEL].{suffix:}'.format(suffix=suffix)
+            ])
+            error_count += 1
+
+        if len(submission_label) < 3 or submission_label[2] != subtask_label:
+            print_error('label', [
+                'Submission label in {description:} filename is wrong [{filename:}]'.format(description=label_description, filename=filename),
+                'Correct format is [AUTHORLASTNAME]_[INSTITUTE]_[{subtask:}]_[1-4]'.format(subtask=subtask_label)
+            ])
+            error_count += 1
+
+        else:
+            if len(submission_label) < 4 or not is_int(submission_label[3]) or int(submission_label[3]) > 4 or int(submission_label[3]) < 1:
+                print_error('label', [
+                    'Submission label in {description:} filename is wrong [{filename:}]'.format(description=label_description, filename=filename),
+                    'Submission index number in submission label has to be 1-4'
+                ])
+                error_count += 1
+
+    return error_count
+
+
 def validate_submission_label(output_filename, meta_filename, submission_label):
     error_count = 0
 
@@ -42,98 +78,210 @@ def validate_submission_label(output_filename, meta_filename, submission_label):
     return error_count
 
 
-def validate_output(data, param):
+def check_output_row(row, csv_fields, param):
+    """Check one system output row, duplicates are not checked here
+
+    Parameters
+    ----------
+    row : list of str
+        Row fields
+
+    csv_fields : list of str
+        Header fields
+
+    param : dict
+        Output parameters
+
+    Returns
+    -------
+    list of tuple
+        (message, message_fields) for each error, message is formatted with row_id and message_fields
+
+    """
+
+    errors = []
+
+    filename_index = None
+    scene_label_index = None
+
+    if 'filename' in csv_fields:
+        filename_index = csv_fields.index('filename')
+
+    if 'scene_label' in csv_fields:
+        scene_label_index = csv_fields.index('scene_label')
+
+    row_filename = os.path.split(row[filename_index])[-1]
+
+    if os.path.splitext(row_filename)[-1] != '.wav':
+        errors.append((
+            'Wrong file extension for file [{filename:}] at row [{row_id:}] (use \'.wav\')',
+            {'filename': row[filename_index]}
+        ))
+
+    if int(os.path.splitext(row_filename)[0]) > param['filename']['index_max']:
+        errors.append((
+            'Illegal filename [{filename:}] at row [{row_id:}] (file index too large)',
+            {'filename': row[filename_index]}
+        ))
+
+    elif int(os.path.splitext(row_filename)[0]) < param['filename']['index_min']:
+        errors.append((
+            'Illegal filename [{filename:}] at row [{row_id:}] (file index too small)',
+            {'filename': row[filename_index]}
+        ))
+
+    if len(row) != len(param['fields']):
+        errors.append(('Wrong field count at row [{row_id:}]', {}))
+
+    if scene_label_index and row[scene_label_index] not in param['scene_labels']:
+        errors.append((
+            'Use of illegal scene label [{scene_label:}] at row [{row_id:}]',
+            {'scene_label': row[scene_label_index]}
+        ))
+
+    for field in param['fields_float']:
+        index = csv_fields.index(field)
+        if index < len(row):
+            current_value = row[csv_fields.index(field)]
+            if not is_float(current_value):
+                errors.append((
+                    'Wrong field type at row [{row_id:}] for field [{field:}={value:}]',
+                    {'field': field, 'value': current_value}
+                ))
+
+    return errors
+
+
+def report_near_duplicates(fingerprint_index, fingerprint, submission_label=None):
+    for near_entry, similarity, same_labels in fingerprint_index.near_duplicates(fingerprint, submission_label=submission_label):
+        other_submissions = [item for item in near_entry['submissions'] if item != submission_label]
+        if same_labels:
+            print_error('index', 'Same scene labels as in previously validated output of [{submissions:}] (similarity {similarity:.2f})'.format(
+                submissions=','.join(other_submissions),
+                similarity=similarity)
+            )
+
+        else:
+            print_error('index', 'Near-duplicate of previously validated output of [{submissions:}] (similarity {similarity:.2f})'.format(
+                submissions=','.join(other_submissions),
+                similarity=similarity)
+            )
+
+
+def validate_output(data, param, budget=None, fingerprint_index=None, submission_label=None):
     error_count = 0
 
+    content_hash = None
+    if fingerprint_index is not None:
+        # Exact duplicates are looked up from raw content, before parsing
+        content_hash = output_content_hash(data)
+        entry = fingerprint_index.lookup(content_hash)
+        if entry is not None:
+            # Entries from earlier runs of the same submission are not reported
+            other_submissions = [item for item in entry['submissions'] if item != submission_label]
+            if other_submissions:
+                print_error('index', 'Identical to previously validated output of [{submissions:}], reusing result [{count:} errors]'.format(
+                    submissions=','.join(other_submissions),
+                    count=entry['error_count'])
+                )
+
+            # Near-duplicates are looked up with the stored sketch
+            fingerprint = fingerprint_index.entry_fingerprint(content_hash)
+            report_near_duplicates(
+                fingerprint_index=fingerprint_index,
+                fingerprint=fingerprint,
+                submission_label=submission_label
+            )
+
+            # Skip re-validation and report stored errors
+            for message in entry['errors']:
+                print_error('output', message)
+
+            fingerprint_index.add(
+                fingerprint=fingerprint,
+                submission_label=submission_label,
+                error_count=entry['error_count'],
+                errors=entry['errors']
+            )
+            return entry['error_count']
+
     f = StringIO(data)
     csv_reader = csv.reader(f, delimiter='\t')
     csv_fields = next(csv_reader)
 
+    rows = []
+    for row in csv_reader:
+        rows.append(row)
+        if budget is not None:
+            budget.check_rows(len(rows))
+            if len(rows) % 1000 == 0:
+                budget.check()
+
+    # Reported errors, stored into fingerprint index
+    errors = []
+
+    def report_error(message):
+        print_error('output', message)
+        errors.append(message)
+
+    fingerprint = None
+    if fingerprint_index is not None:
+        fingerprint = output_fingerprint(content_hash=content_hash, csv_fields=csv_fields, rows=rows, param=param)
+        report_near_duplicates(
+            fingerprint_index=fingerprint_index,
+            fingerprint=fingerprint,
+            submission_label=submission_label
+        )
+
     # Check that headers exists
     if 'filename' not in csv_fields:
-        print_error('output', 'No header row in output file')
+        report_error('No header row in output file')
 
     # Check field names
     if check_fields(csv_fields, param['fields']):
-        print_error('output', ['Errors in header fields in the output file', 'Correct header fields are [{fields:}]'.format(
+        report_error(['Errors in header fields in the output file', 'Correct header fields are [{fields:}]'.format(
             fields=','.join(param['fields']))]
         )
         error_count += 1
 
     filename_index = None
-    scene_label_index = None
 
     if 'filename' in csv_fields:
         filename_index = csv_fields.index('filename')
 
-    if 'scene_label' in csv_fields:
-        scene_label_index = csv_fields.index('scene_label')
-
-    file_index = []
-    for row_id, row in enumerate(csv_reader):
+    file_index = set()
+    for row_id, row in enumerate(rows):
         row_filename = os.path.split(row[filename_index])[-1]
 
         if row_filename in file_index:
-            print_error('output', 'Duplicate file [{filename:}] at row [{row_id:}]'.format(
+            report_error('Duplicate file [{filename:}] at row [{row_id:}]'.format(
                 filename=row[filename_index],
                 row_id=row_id + 1)
             )
             error_count += 1
 
         else:
-            file_index.append(row_filename)
+            file_index.add(row_filename)
 
-        if os.path.splitext(row_filename)[-1] != '.wav':
-            print_error('output', 'Wrong file extension for file [{filename:}] at row [{row_id:}] (use \'.wav\')'.format(
-                filename=row[filename_index],
-                row_id=row_id + 1)
-            )
+        for message, message_fields in check_output_row(row=row, csv_fields=csv_fields, param=param):
+            report_error(message.format(row_id=row_id + 1, **message_fields))
             error_count += 1
 
-        if int(os.path.splitext(row_filename)[0]) > param['filename']['index_max']:
-            print_error('output', 'Illegal filename [{filename:}] at row [{row_id:}] (file index too large)'.format(
-                filename=row[filename_index],
-                row_id=row_id + 1)
-            )
-            error_count += 1
-
-        elif int(os.path.splitext(row_filename)[0]) < param['filename']['index_min']:
-            print_error('output', 'Illegal filename [{filename:}] at row [{row_id:}] (file index too small)'.format(
-                filename=row[filename_index],
-                row_id=row_id + 1)
-            )
-            error_count += 1
-
-        if len(row) != len(param['fields']):
-            print_error('output', 'Wrong field count at row [{row_id:}]'.format(row_id=row_id + 1))
-            error_count += 1
-
-        if scene_label_index and row[scene_label_index] not in param['scene_labels']:
-            print_error('output', 'Use of illegal scene label [{scene_label:}] at row [{row_id:}]'.format(
-                scene_label=row[scene_label_index],
-                row_id=row_id + 1)
-            )
-            error_count += 1
-
-        for field in param['fields_float']:
-            index = csv_fields.index(field)
-            if index < len(row):
-                current_value = row[csv_fields.index(field)]
-                if not is_float(current_value):
-                    print_error('output', 'Wrong field type at row [{row_id:}] for field [{field:}={value:}]'.format(
-                        row_id=row_id + 1,
-                        field=field,
-                        value=current_value)
-                    )
-                    error_count += 1
-
     if len(file_index) != param['unique_file_count']:
-        print_error('output', 'Incorrect number of outputted entries [{count:} != {target:}] (unique filenames counted)'.format(
+        report_error('Incorrect number of outputted entries [{count:} != {target:}] (unique filenames counted)'.format(
             count=len(file_index),
             target=param['unique_file_count'])
         )
         error_count += 1
 
+    if fingerprint_index is not None:
+        fingerprint_index.add(
+            fingerprint=fingerprint,
+            submission_label=submission_label,
+            error_count=error_count,
+            errors=errors
+        )
+
     return error_count
 
 
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Toni Heittola ( toni.heittola@tuni.fi ), Tampere University / Audio Research Group
+# License: MIT
+
+import os
+import io
+import csv
+import time
+import hashlib
+import contextlib
+from validators import *
+from limits import *
+
+try:
+    import yaml
+except ImportError:
+    raise ImportError('Unable to import YAML module. You can install it with `pip install pyyaml`.')
+
+# Rows per block when searching changed region
+BLOCK_SIZE = 256
+
+POLL_INTERVAL = 0.2
+
+
+def _block_hashes(lines):
+    return [hash(tuple(lines[i:i + BLOCK_SIZE])) for i in range(0, len(lines), BLOCK_SIZE)]
+
+
+class OutputState(object):
+    """Parsed state of a system output file for incremental re-validation
+
+    Per-row check results are kept aligned with data rows, together with filename counts for
+    duplicate and missing entries. On update only rows between the common prefix and suffix of the
+    old and new content are parsed and checked.
+
+    """
+
+    def __init__(self, param):
+        """Constructor
+
+        Parameters
+        ----------
+        param : dict
+            Output parameters
+
+        """
+
+        self.param = param
+        self.reset()
+
+    def reset(self):
+        self.lines = []
+        self.block_hashes = []
+        self.csv_fields = None
+        self.header_error_count = 0
+        self.row_filenames = []
+        self.row_errors = []
+        self.row_error_count = 0
+        self.filename_counts = {}
+        self.duplicate_count = 0
+        self.row_cache = {}
+
+    @property
+    def unique_file_count(self):
+        return len(self.filename_counts)
+
+    @property
+    def error_count(self):
+        error_count = self.header_error_count + self.row_error_count + self.duplicate_count
+        if self.unique_file_count != self.param['unique_file_count']:
+            error_count += 1
+
+        return error_count
+
+    def update(self, data, budget=None):
+        """Update state with new file content
+
+        Parameters
+        ----------
+        data : str
+            File content
+
+        budget : ResourceBudget
+            Resource limits.
+            Default value None
+
+        Returns
+        -------
+        tuple of list
+            Removed row indices in old content and changed row indices in new content (0-based, data rows),
+            both are empty only when rows are unchanged
+
+        """
+
+        lines = data.splitlines()
+        if budget is not None:
+            budget.check_rows(max(len(lines) - 1, 0))
+
+        if not lines:
+            removed_rows = list(range(0, len(self.row_filenames)))
+            self.reset()
+            return removed_rows, []
+
+        removed_rows = []
+        if self.csv_fields is None or not self.lines or lines[0] != self.lines[0]:
+            # Header changed, everything is validated again
+            removed_rows = list(range(0, len(self.row_filenames)))
+            self.reset()
+            self.csv_fields = next(csv.reader([lines[0]], delimiter='\t'))
+            self.header_error_count = 0
+            if check_fields(self.csv_fields, self.param['fields']):
+                self.header_error_count += 1
+
+            old_lines = [lines[0]]
+            old_block_hashes = _block_hashes(old_lines)
+
+        else:
+            old_lines = self.lines
+            old_block_hashes = self.block_hashes
+
+        new_block_hashes = _block_hashes(lines)
+
+        # Common prefix, first block-wise then row-wise
+        prefix = 0
+        block_id = 0
+        while block_id < min(len(old_block_hashes), len(new_block_hashes)) - 1 and old_block_hashes[block_id] == new_block_hashes[block_id]:
+            block_id += 1
+
+        prefix = block_id * BLOCK_SIZE
+        while prefix < min(len(old_lines), len(lines)) and old_lines[prefix] == lines[prefix]:
+            prefix += 1
+
+        # Common suffix, row-wise, not overlapping prefix
+        suffix = 0
+        while (suffix < min(len(old_lines), len(lines)) - prefix and
+               old_lines[len(old_lines) - 1 - suffix] == lines[len(lines) - 1 - suffix]):
+            suffix += 1
+
+        # Line indices to row indices (line 0 is header)
+        row_start = max(prefix - 1, 0)
+        old_row_end = len(old_lines) - 1 - suffix
+        new_row_end = len(lines) - 1 - suffix
+
+        for row_index in range(row_start, old_row_end):
+            self._remove_row(row_index)
+
+        new_filenames = []
+        new_errors = []
+        for line in lines[row_start + 1:new_row_end + 1]:
+            filename, errors = self._check_line(line)
+            new_filenames.append(filename)
+            new_errors.append(errors)
+            self._add_filename(filename)
+            self.row_error_count += len(errors)
+
+        self.row_filenames[row_start:old_row_end] = new_filenames
+        self.row_errors[row_start:old_row_end] = new_errors
+
+        self.lines = lines
+        self.block_hashes = new_block_hashes
+
+        return removed_rows + list(range(row_start, old_row_end)), list(range(row_start, new_row_end))
+
+    def duplicate_rows(self, row_index):
+        """Rows having the same filename as the given row"""
+
+        filename = self.row_filenames[row_index]
+        if filename is None or self.filename_counts.get(filename, 0) < 2:
+            return []
+
+        return [index for index, item in enumerate(self.row_filenames) if item == filename]
+
+    def _check_line(self, line):
+        if line not in self.row_cache:
+            row = next(csv.reader([line], delimiter='\t'), [])
+            filename = None
+            try:
+                if 'filename' in self.csv_fields:
+                    filename = os.path.split(row[self.csv_fields.index('filename')])[-1]
+
+                errors = check_output_row(row=row, csv_fields=self.csv_fields, param=self.param)
+
+            except (IndexError, ValueError):
+                errors = [('Unable to validate row [{row_id:}]', {})]
+
+            self.row_cache[line] = (filename, errors)
+
+        return self.row_cache[line]
+
+    def _remove_row(self, row_index):
+        filename = self.row_filenames[row_index]
+        if filename is not None:
+            count = self.filename_counts[filename]
+            if count > 1:
+                self.duplicate_count -= 1
+                self.filename_counts[filename] = count - 1
+
+            else:
+                del self.filename_counts[filename]
+
+        self.row_error_count -= len(self.row_errors[row_index])
+
+    def _add_filename(self, filename):
+        if filename is not None:
+            count = self.filename_counts.get(filename, 0)
+            if count > 0:
+                self.duplicate_count += 1
+
+            self.filename_counts[filename] = count + 1
+
+
+def load_meta(filename, budget=None):
+    """Load meta information file
+
+    Parameters
+    ----------
+    filename : str
+        Meta file in YAML format
+
+    budget : ResourceBudget
+        Resource limits.
+        Default value None
+
+    Returns
+    -------
+    dict or None
+        None if the file is wrongly formatted, error is printed
+
+    """
+
+    try:
+        with open(filename, 'rb') as infile:
+            data = budget.read(file=infile, name=filename) if budget is not None else infile.read()
+
+        return yaml.load(data, Loader=yaml.FullLoader)
+
+    except yaml.YAMLError as exc:
+        print_error('meta', 'Wrongly formatted YAML file [{filename:}]'.format(filename=os.path.split(filename)[-1]))
+        if hasattr(exc, 'problem_mark'):
+            print('               {mark:} {problem:}'.format(mark=str(exc.problem_mark).strip(), problem=exc.problem))
+
+        return None
+
+
+def _file_signature(filename):
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch(output, meta, subtask_label, param, limits=None, poll_interval=POLL_INTERVAL):
+    """Watch system output and meta files, and re-validate changed parts on each change
+
+    Parameters
+    ----------
+    output : str
+        System output file in CSV format
+
+    meta : str
+        Meta information file in YAML format
+
+    subtask_label : str
+        Subtask label, task1a or task1b
+
+    param : dict
+        Task parameters with 'output' and 'meta' blocks
+
+    limits : dict
+        Resource limits.
+        Default value None
+
+    poll_interval : float
+        File polling interval in seconds.
+        Default value POLL_INTERVAL
+
+    """
+
+    output_filename = os.path.split(output)[-1]
+    meta_filename = os.path.split(meta)[-1]
+
+    state = OutputState(param=param['output'])
+    output_signature = None
+    output_hash = None
+    meta_signature = None
+    meta_hash = None
+    meta_error_count = 0
+    first = True
+
+    print('')
+    print('Watching for changes, press Ctrl+C to stop')
+
+    try:
+        while True:
+            try:
+                current_output_signature = _file_signature(output)
+                current_meta_signature = _file_signature(meta)
+
+            except OSError:
+                # File is being replaced by an editor
+                time.sleep(poll_interval)
+                continue
+
+            if current_output_signature == output_signature and current_meta_signature == meta_signature:
+                time.sleep(poll_interval)
+                continue
+
+            start_time = time.time()
+            budget = ResourceBudget(limits=limits)
+
+            try:
+                report = []
+                if current_output_signature != output_signature:
+                    output_signature = current_output_signature
+                    with open(output, 'rb') as file:
+                        raw_data = budget.read(file=file, name=output)
+
+                    current_output_hash = hashlib.sha256(raw_data).hexdigest()
+                    if current_output_hash != output_hash:
+                        removed_rows, changed_rows = state.update(data=raw_data.decode('utf-8'), budget=budget)
+                        output_hash = current_output_hash
+
+                        # Reported also when rows were only removed, totals change
+                        if not first:
+                            summary = ' Output file: [{filename:}] {count:} rows re-validated'.format(
+                                filename=output_filename,
+                                count=len(changed_rows)
+                            )
+                            if len(removed_rows) > len(changed_rows):
+                                summary += ', {count:} rows removed'.format(count=len(removed_rows) - len(changed_rows))
+
+                            report.append(summary)
+                            for row_index in changed_rows:
+                                for message, message_fields in state.row_errors[row_index]:
+                                    report.append(('output', message.format(row_id=row_index + 1, **message_fields)))
+
+                                duplicates = state.duplicate_rows(row_index)
+                                if duplicates:
+                                    report.append(('output', 'Duplicate file [{filename:}] at rows [{row_ids:}]'.format(
+                                        filename=state.row_filenames[row_index],
+                                        row_ids=','.join(str(index + 1) for index in duplicates))
+                                    ))
+
+                if current_meta_signature != meta_signature:
+                    meta_signature = current_meta_signature
+                    with open(meta, 'rb') as file:
+                        current_meta_hash = hashlib.sha256(budget.read(file=file, name=meta)).hexdigest()
+
+                    if current_meta_hash != meta_hash:
+                        meta_hash = current_meta_hash
+                        meta_log = io.StringIO()
+                        with contextlib.redirect_stdout(meta_log):
+                            meta_data = load_meta(filename=meta, budget=budget)
+                            if meta_data is None:
+                                meta_error_count = 1
+
+                            else:
+                                meta_error_count = validate_meta_data(meta_data, subtask_label, param['meta'])
+                                if 'submission' in meta_data and 'label' in meta_data['submission']:
+                                    meta_error_count += validate_submission_label(
+                                        output_filename, meta_filename, meta_data['submission']['label']
+                                    )
+
+                        if not first:
+                            report.append(' Meta file:   [{filename:}] re-validated'.format(filename=meta_filename))
+                            report.append(meta_log.getvalue().rstrip('\n'))
+
+                if first:
+                    # Initial state, full report was already printed
+                    first = False
+                    continue
+
+                if not report:
+                    # Files touched without content changes
+                    continue
+
+                print('------------------------------------------------------')
+                for item in report:
+                    if isinstance(item, tuple):
+                        print_error(*item)
+
+                    else:
+                        print(item)
+
+                if state.unique_file_count != param['output']['unique_file_count']:
+                    print_error('output', 'Incorrect number of outputted entries [{count:} != {target:}] (unique filenames counted)'.format(
+                        count=state.unique_file_count,
+                        target=param['output']['unique_file_count'])
+                    )
+
+                print('Total errors: output {output_count:}, meta {meta_count:} [{elapsed:.1f} ms]'.format(
+                    output_count=state.error_count,
+                    meta_count=meta_error_count,
+                    elapsed=(time.time() - start_time) * 1000)
+                )
+
+            except (IOError, ValueError, KeyError, TypeError) as exc:
+                print_error('watch', str(exc))
+
+    except KeyboardInterrupt:
+        pass